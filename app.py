@@ -1,9 +1,10 @@
 import streamlit as st
 import os
 import tempfile
-from utils import process_presentation
+import hashlib
+from pptx import Presentation
+from utils import process_presentation, extract_text_from_slides
 import time
-import re
 from avatar_generator import create_avatar_video
 
 # Set page config
@@ -48,12 +49,10 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-def extract_progress(text):
-    """Extract progress percentage from the processing output"""
-    match = re.search(r'Processing slide \d+/\d+ \((\d+\.\d+)%\)', text)
-    if match:
-        return float(match.group(1))
-    return 0
+@st.cache_data(max_entries=8, show_spinner=False)
+def cached_extract_texts(pptx_digest, _ppt_path):
+    """Extract the slide texts once per distinct uploaded deck (keyed by its digest)"""
+    return extract_text_from_slides(Presentation(_ppt_path))
 
 def main():
     st.title("🎥 PowerPoint to Video Converter")
@@ -136,14 +135,30 @@ def main():
             -50, 50, 0,
             help="Adjust the pitch of the voice"
         )
+        
+        tts_engine = st.selectbox(
+            "Speech Engine",
+            ["Google (gTTS)", "Microsoft Edge (edge-tts)", "Offline (pyttsx3)"],
+            help="Edge voices are generated for all slides at once; the offline engine needs no network access"
+        )
+        tts_backend = {
+            "Google (gTTS)": "gtts",
+            "Microsoft Edge (edge-tts)": "edge",
+            "Offline (pyttsx3)": "pyttsx3"
+        }[tts_engine]
     
     # Main content
     uploaded_file = st.file_uploader("Upload your PowerPoint presentation", type=['pptx'])
     
     if uploaded_file is not None:
-        # Save uploaded file
+        # Stream the upload to disk in 1 MiB chunks, hashing it on the way
+        # for the text cache, without materializing another copy in memory
+        pptx_digest = hashlib.sha256()
+        uploaded_file.seek(0)
         with tempfile.NamedTemporaryFile(delete=False, suffix='.pptx') as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
+            for chunk in iter(lambda: uploaded_file.read(1 << 20), b""):
+                pptx_digest.update(chunk)
+                tmp_file.write(chunk)
             ppt_path = tmp_file.name
         
         # Video settings
@@ -201,54 +216,35 @@ def main():
                 if not os.path.exists(output_dir):
                     os.makedirs(output_dir)
                 
+                # Update the progress bar at most ten times a second
+                last_update = 0.0
+                
+                def update_progress(completed, total):
+                    nonlocal last_update
+                    now = time.time()
+                    if completed < total and now - last_update < 0.1:
+                        return
+                    last_update = now
+                    st.session_state['progress'] = completed / total
+                    progress_bar.progress(completed / total)
+                    status_text.text(f"Rendered slide {completed}/{total}")
+                
                 # Process the presentation
                 with st.spinner("Processing your presentation... This may take a few minutes."):
-                    # Start processing in a separate thread to update progress
-                    import threading
-                    import queue
-                    
-                    output_queue = queue.Queue()
+                    final_video = process_presentation(
+                        ppt_path,
+                        os.path.join(output_dir, "presentation.mp4"),
+                        voice_type=voice_type.lower(),
+                        speech_rate=speech_rate,
+                        speech_pitch=speech_pitch,
+                        avatar_style=avatar_style.lower(),
+                        did_api_key=did_api_key if use_did else None,
+                        tts_backend=tts_backend,
+                        slide_texts=cached_extract_texts(pptx_digest.hexdigest(), ppt_path),
+                        progress_callback=update_progress
+                    )
                     
-                    def process_with_progress():
-                        output_files = process_presentation(
-                            ppt_path,
-                            output_dir,
-                            avatar_style.lower(),
-                            voice_type.lower(),
-                            speech_rate,
-                            speech_pitch,
-                            use_gpt,
-                            gpt_api_key if use_gpt else None,
-                            did_api_key if use_did else None
-                        )
-                        output_queue.put(output_files)
-                    
-                    # Start processing thread
-                    process_thread = threading.Thread(target=process_with_progress)
-                    process_thread.start()
-                    
-                    # Update progress while processing
-                    last_progress = 0
-                    while process_thread.is_alive():
-                        # Get the latest output from the processing
-                        try:
-                            output = output_queue.get_nowait()
-                            if output:
-                                progress = extract_progress(str(output))
-                                if progress > last_progress:
-                                    progress_bar.progress(progress / 100)
-                                    status_text.text(f"Processing: {progress:.1f}% complete")
-                                    last_progress = progress
-                        except queue.Empty:
-                            pass
-                        time.sleep(0.1)
-                    
-                    # Get final result
-                    output_files = output_queue.get()
-                    
-                    if output_files:
-                        final_video = output_files[-1]  # Get the last processed video
-                        
+                    if final_video:
                         # Update progress to 100%
                         progress_bar.progress(1.0)
                         status_text.text("Processing completed!")
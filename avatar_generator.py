@@ -1,14 +1,34 @@
 import os
-import requests
-import json
-from typing import Optional
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip, ColorClip
+import textwrap
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from did_avatar import DIDAvatar
+from ffmpeg_utils import run_ffmpeg
+
+# D-ID presenter and voice used for each avatar style
+DID_PRESENTERS = {
+    "default": {
+        "avatar_id": "Emma_f",
+        "voice": "en-US-JennyNeural"
+    },
+    "professional": {
+        "avatar_id": "John_f",
+        "voice": "en-US-GuyNeural"
+    },
+    "casual": {
+        "avatar_id": "Sarah_f",
+        "voice": "en-US-AriaNeural"
+    }
+}
 
 def create_avatar_video(
     text: str,
     output_path: str,
     avatar_style: str = "default",
-    did_api_key: Optional[str] = None
+    did_api_key: Optional[str] = None,
+    duration: float = 5.0
 ) -> str:
     """
     Create an avatar video using D-ID API or fallback to a simple avatar.
@@ -18,80 +38,83 @@ def create_avatar_video(
         output_path: Path where the video will be saved
         avatar_style: Style of the avatar (default, professional, casual)
         did_api_key: D-ID API key for creating AI avatars
+        duration: Length in seconds of the fallback simple avatar
         
     Returns:
         str: Path to the generated video
     """
     if did_api_key:
         try:
-            # D-ID API endpoint
-            url = "https://api.d-id.com/talks"
-            
-            # Configure the avatar based on style
-            avatar_config = {
-                "default": {
-                    "source_url": "https://create-images-results.d-id.com/DefaultPresenters/Emma_f/image.jpg",
-                    "voice": "en-US-JennyNeural"
-                },
-                "professional": {
-                    "source_url": "https://create-images-results.d-id.com/DefaultPresenters/John_f/image.jpg",
-                    "voice": "en-US-GuyNeural"
-                },
-                "casual": {
-                    "source_url": "https://create-images-results.d-id.com/DefaultPresenters/Sarah_f/image.jpg",
-                    "voice": "en-US-AriaNeural"
-                }
-            }.get(avatar_style, avatar_config["default"])
-            
-            # Prepare the request payload
-            payload = {
-                "script": {
-                    "type": "text",
-                    "input": text
-                },
-                "source_url": avatar_config["source_url"],
-                "voice": avatar_config["voice"]
-            }
-            
-            # Make the API request
-            headers = {
-                "Authorization": f"Basic {did_api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            response = requests.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            
-            # Get the video URL from the response
-            result = response.json()
-            video_url = result["result_url"]
-            
-            # Download the video
-            video_response = requests.get(video_url)
-            video_response.raise_for_status()
-            
-            # Save the video
-            with open(output_path, "wb") as f:
-                f.write(video_response.content)
-                
-            return output_path
+            presenter = DID_PRESENTERS.get(avatar_style, DID_PRESENTERS["default"])
+            return DIDAvatar(did_api_key).create_talking_avatar(
+                text, output_path, presenter["avatar_id"], presenter["voice"]
+            )
             
         except Exception as e:
             print(f"Error creating D-ID avatar: {str(e)}")
             # Fall back to simple avatar
-            return _create_simple_avatar(text, output_path, avatar_style)
+            return _create_simple_avatar(text, output_path, avatar_style, duration)
     else:
         # Create simple avatar if no API key is provided
-        return _create_simple_avatar(text, output_path, avatar_style)
+        return _create_simple_avatar(text, output_path, avatar_style, duration)
+
+def create_avatar_videos(
+    texts: List[str],
+    output_paths: List[str],
+    avatar_style: str,
+    did_api_key: str
+) -> List[Optional[str]]:
+    """
+    Create D-ID avatar videos for several texts as a single batch.
+    
+    Args:
+        texts: The text to be spoken by each avatar
+        output_paths: Path where each video will be saved
+        avatar_style: Style of the avatar (default, professional, casual)
+        did_api_key: D-ID API key for creating AI avatars
+        
+    Returns:
+        list: Path to each generated video, or None for each slide whose avatar failed
+    """
+    try:
+        presenter = DID_PRESENTERS.get(avatar_style, DID_PRESENTERS["default"])
+        return DIDAvatar(did_api_key).create_talking_avatars(
+            texts, output_paths, presenter["avatar_id"], presenter["voice"]
+        )
+    except Exception as e:
+        print(f"Error creating D-ID avatars: {str(e)}")
+        return [None] * len(texts)
 
-def _create_simple_avatar(text: str, output_path: str, avatar_style: str) -> str:
+SIMPLE_AVATAR_SIZE = (640, 480)
+SIMPLE_AVATAR_FPS = 24
+
+@lru_cache(maxsize=8)
+def _avatar_background(bg_color: Tuple[int, int, int]) -> np.ndarray:
+    """Solid background frame for a style, built once and shared read-only"""
+    frame = np.full((SIMPLE_AVATAR_SIZE[1], SIMPLE_AVATAR_SIZE[0], 3), bg_color, dtype=np.uint8)
+    frame.setflags(write=False)
+    return frame
+
+@lru_cache(maxsize=8)
+def _avatar_font(size: int):
+    """Load the bold caption font once per size"""
+    try:
+        return ImageFont.truetype("arialbd.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+def _create_simple_avatar(text: str, output_path: str, avatar_style: str, duration: float = 5.0) -> str:
     """
     Create a simple avatar video with text overlay.
     
+    The caption never changes, so a single frame is rendered with PIL and
+    ffmpeg repeats it, instead of compositing every frame through MoviePy.
+    
     Args:
         text: The text to display
         output_path: Path where the video will be saved
         avatar_style: Style of the avatar (default, professional, casual)
+        duration: Length of the video in seconds
         
     Returns:
         str: Path to the generated video
@@ -117,28 +140,33 @@ def _create_simple_avatar(text: str, output_path: str, avatar_style: str) -> str
     
     style = styles.get(avatar_style, styles["default"])
     
-    # Create background
-    duration = 5  # seconds
-    bg_clip = ColorClip(size=(640, 480), color=style["bg_color"])
-    bg_clip = bg_clip.set_duration(duration)
-    
-    # Create text clip
-    text_clip = TextClip(
-        text,
-        fontsize=style["font_size"],
-        color=style["text_color"],
-        font="Arial-Bold",
-        size=(600, None),
-        method="caption"
-    ).set_duration(duration)
-    
-    # Center the text
-    text_clip = text_clip.set_position("center")
+    # Draw the caption onto a copy of the cached background
+    frame = Image.fromarray(_avatar_background(style["bg_color"]))
+    draw = ImageDraw.Draw(frame)
+    font = _avatar_font(style["font_size"])
     
-    # Combine clips
-    final_clip = CompositeVideoClip([bg_clip, text_clip])
+    # Wrap the caption to a 600px wide box using the average glyph width
+    char_width = font.getlength("abcdefghijklmnopqrstuvwxyz") / 26
+    caption = textwrap.fill(text, width=max(1, int(600 / char_width)))
+    draw.multiline_text(
+        (SIMPLE_AVATAR_SIZE[0] / 2, SIMPLE_AVATAR_SIZE[1] / 2),
+        caption,
+        font=font,
+        fill=style["text_color"],
+        anchor="mm",
+        align="center"
+    )
     
-    # Write the video file
-    final_clip.write_videofile(output_path, fps=24)
+    # Pipe the single raw frame to ffmpeg and let it repeat the frame
+    frame_count = max(1, round(duration * SIMPLE_AVATAR_FPS))
+    run_ffmpeg([
+        "-f", "rawvideo", "-pix_fmt", "rgb24",
+        "-s", f"{SIMPLE_AVATAR_SIZE[0]}x{SIMPLE_AVATAR_SIZE[1]}",
+        "-framerate", str(SIMPLE_AVATAR_FPS), "-i", "-",
+        "-vf", f"loop=loop={frame_count - 1}:size=1:start=0",
+        "-c:v", "libx264", "-preset", "ultrafast", "-tune", "stillimage",
+        "-pix_fmt", "yuv420p",
+        output_path
+    ], input=frame.tobytes())
     
     return output_path 
\ No newline at end of file
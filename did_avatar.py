@@ -1,8 +1,28 @@
 import os
+import asyncio
 import requests
+import aiohttp
 import json
 import time
-from typing import Optional
+import random
+from typing import Callable, Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared keep-alive session so every D-ID call reuses pooled TLS connections
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+
+# Maximum number of talks submitted to D-ID at once, to stay under its rate limit
+DID_MAX_CONCURRENT = 4
+
+# Polling budget for a batch of talks: a base allowance plus some time per talk
+DID_BATCH_TIMEOUT = 60
+DID_TIMEOUT_PER_TALK = 15
 
 class DIDAvatar:
     """Class to handle D-ID API integration for creating talking avatars"""
@@ -18,43 +38,53 @@ class DIDAvatar:
             "Authorization": f"Basic {self.api_key}",
             "Content-Type": "application/json"
         }
+        self.session = _SESSION
+    
+    def _build_payload(self, text: str, avatar_id: str, voice_id: str = "en-US-JennyNeural") -> dict:
+        """Build the request payload for a D-ID talk"""
+        return {
+            "script": {
+                "type": "text",
+                "input": text,
+                "subtitles": False,
+                "provider": {
+                    "type": "microsoft",
+                    "voice_id": voice_id,
+                    "voice_config": {
+                        "style": "chat",
+                        "rate": 1.0,
+                        "pitch": 0
+                    }
+                }
+            },
+            "config": {
+                "fluent": True,
+                "pad_audio": 0
+            },
+            "source_url": f"https://create-images-results.d-id.com/DefaultPresenters/{avatar_id}/image.jpg"
+        }
+    
+    def create_talk(self, text: str, avatar_id: str = "anna_costume1", voice_id: str = "en-US-JennyNeural") -> str:
+        """Submit a talk to D-ID and return its ID without waiting for the video"""
+        response = self.session.post(
+            f"{self.base_url}/talks",
+            headers=self.headers,
+            json=self._build_payload(text, avatar_id, voice_id)
+        )
+        response.raise_for_status()
+        return response.json()["id"]
     
-    def create_talking_avatar(self, text: str, output_path: str, avatar_id: str = "anna_costume1") -> str:
+    def create_talking_avatar(
+        self,
+        text: str,
+        output_path: str,
+        avatar_id: str = "anna_costume1",
+        voice_id: str = "en-US-JennyNeural"
+    ) -> str:
         """Create a talking avatar video using D-ID API"""
         try:
-            # Prepare the request payload
-            payload = {
-                "script": {
-                    "type": "text",
-                    "input": text,
-                    "subtitles": False,
-                    "provider": {
-                        "type": "microsoft",
-                        "voice_id": "en-US-JennyNeural",
-                        "voice_config": {
-                            "style": "chat",
-                            "rate": 1.0,
-                            "pitch": 0
-                        }
-                    }
-                },
-                "config": {
-                    "fluent": True,
-                    "pad_audio": 0
-                },
-                "source_url": f"https://create-images-results.d-id.com/DefaultPresenters/{avatar_id}/image.jpg"
-            }
-            
-            # Make API request
-            response = requests.post(
-                f"{self.base_url}/talks",
-                headers=self.headers,
-                json=payload
-            )
-            response.raise_for_status()
-            
-            # Get the talk ID from response
-            talk_id = response.json()["id"]
+            # Submit the talk
+            talk_id = self.create_talk(text, avatar_id, voice_id)
             
             # Wait for the video to be ready
             video_url = self._wait_for_video(talk_id)
@@ -68,32 +98,232 @@ class DIDAvatar:
             print(f"Error in D-ID API: {str(e)}")
             raise
     
+    def create_talking_avatars(
+        self,
+        texts: List[str],
+        output_paths: List[str],
+        avatar_id: str = "anna_costume1",
+        voice_id: str = "en-US-JennyNeural"
+    ) -> List[Optional[str]]:
+        """Synchronous entry point for acreate_talking_avatars"""
+        if not texts:
+            return []
+        return asyncio.run(self.acreate_talking_avatars(texts, output_paths, avatar_id, voice_id))
+    
+    def _get_talk(self, talk_id: str) -> dict:
+        """Fetch the current state of a talk"""
+        response = self.session.get(
+            f"{self.base_url}/talks/{talk_id}",
+            headers=self.headers
+        )
+        response.raise_for_status()
+        return response.json()
+    
     def _wait_for_video(self, talk_id: str, timeout: int = 60) -> str:
-        """Wait for the video to be ready and return its URL"""
+        """
+        Wait for the video to be ready and return its URL.
+        
+        Backs off exponentially with jitter between polls; a status request
+        that fails is simply retried on the next poll.
+        """
         start_time = time.time()
+        delay = 0.5
         while time.time() - start_time < timeout:
-            response = requests.get(
-                f"{self.base_url}/talks/{talk_id}",
-                headers=self.headers
-            )
-            response.raise_for_status()
-            
-            status = response.json()["status"]
-            if status == "done":
-                return response.json()["result_url"]
-            elif status == "error":
-                raise Exception(f"Error creating video: {response.json().get('error', 'Unknown error')}")
+            try:
+                talk = self._get_talk(talk_id)
+            except requests.RequestException:
+                talk = {}
+            if talk.get("status") == "done":
+                return talk["result_url"]
+            if talk.get("status") == "error":
+                raise Exception(f"Error creating video: {talk.get('error', 'Unknown error')}")
             
-            time.sleep(1)
+            time.sleep(delay + random.uniform(0, 0.25))
+            delay = min(8.0, delay * 1.5)
         
         raise TimeoutError("Timeout waiting for video creation")
     
     def _download_video(self, url: str, output_path: str):
         """Download the video from URL to the specified path"""
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
+        with self.session.get(url, stream=True) as response:
+            response.raise_for_status()
+            
+            with open(output_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    if chunk:
+                        f.write(chunk)
+    
+    async def acreate_talking_avatar(
+        self,
+        session: aiohttp.ClientSession,
+        text: str,
+        output_path: str,
+        avatar_id: str = "anna_costume1",
+        voice_id: str = "en-US-JennyNeural"
+    ) -> str:
+        """Create a talking avatar video without blocking the event loop"""
+        try:
+            talk_id = await self._acreate_talk(session, text, avatar_id, voice_id)
+            
+            video_url = await self._await_video(session, talk_id)
+            await self._adownload_video(session, video_url, output_path)
+            
+            return output_path
+            
+        except Exception as e:
+            print(f"Error in D-ID API: {str(e)}")
+            raise
+    
+    async def acreate_talking_avatars(
+        self,
+        texts: List[str],
+        output_paths: List[str],
+        avatar_id: str = "anna_costume1",
+        voice_id: str = "en-US-JennyNeural"
+    ) -> List[Optional[str]]:
+        """
+        Create several talking avatars as one batch over a pooled aiohttp session.
+        
+        Talks are submitted at most DID_MAX_CONCURRENT at a time and then
+        polled together by a single apoll_many coroutine; each video is
+        downloaded as soon as it is ready while the remaining talks are still
+        rendering. A talk that fails (submission, rendering, timeout or
+        download) only loses its own avatar.
+        
+        Returns:
+            list: Path to each downloaded video, or None where that talk failed
+        """
+        semaphore = asyncio.Semaphore(DID_MAX_CONCURRENT)
+        
+        async def submit(text):
+            async with semaphore:
+                try:
+                    return await self._acreate_talk(session, text, avatar_id, voice_id)
+                except Exception as e:
+                    print(f"Error submitting D-ID talk: {str(e)}")
+                    return None
+        
+        connector = aiohttp.TCPConnector(limit=32)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            talk_ids = await asyncio.gather(*[submit(text) for text in texts])
+            output_by_talk = {
+                talk_id: output_path
+                for talk_id, output_path in zip(talk_ids, output_paths)
+                if talk_id
+            }
+            
+            downloads = {}
+            
+            def start_download(talk_id, url):
+                downloads[talk_id] = asyncio.create_task(
+                    self._adownload_video(session, url, output_by_talk[talk_id])
+                )
+            
+            try:
+                await self.apoll_many(
+                    session,
+                    list(output_by_talk),
+                    timeout=DID_BATCH_TIMEOUT + DID_TIMEOUT_PER_TALK * len(output_by_talk),
+                    on_ready=start_download,
+                    on_error=lambda talk_id, error: print(f"Error creating D-ID video: {error}")
+                )
+            except Exception as e:
+                print(f"Error waiting for D-ID videos: {str(e)}")
+            finally:
+                # Let downloads that already started finish before the session closes
+                outcomes = await asyncio.gather(*downloads.values(), return_exceptions=True)
         
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk) 
\ No newline at end of file
+        downloaded = set()
+        for talk_id, outcome in zip(downloads, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Error downloading D-ID video: {str(outcome)}")
+            else:
+                downloaded.add(talk_id)
+        return [output_by_talk[talk_id] if talk_id in downloaded else None for talk_id in talk_ids]
+    
+    async def _acreate_talk(
+        self,
+        session: aiohttp.ClientSession,
+        text: str,
+        avatar_id: str = "anna_costume1",
+        voice_id: str = "en-US-JennyNeural"
+    ) -> str:
+        """Asynchronously submit a talk to D-ID and return its ID"""
+        payload = self._build_payload(text, avatar_id, voice_id)
+        async with session.post(f"{self.base_url}/talks", headers=self.headers, json=payload) as response:
+            response.raise_for_status()
+            return (await response.json())["id"]
+    
+    async def _aget_talk(self, session: aiohttp.ClientSession, talk_id: str) -> dict:
+        """Asynchronously fetch the current state of a talk"""
+        async with session.get(f"{self.base_url}/talks/{talk_id}", headers=self.headers) as response:
+            response.raise_for_status()
+            return await response.json()
+    
+    async def _await_video(self, session: aiohttp.ClientSession, talk_id: str, timeout: int = 60) -> str:
+        """Asynchronously wait for the video to be ready and return its URL"""
+        return (await self.apoll_many(session, [talk_id], timeout))[talk_id]
+    
+    async def apoll_many(
+        self,
+        session: aiohttp.ClientSession,
+        talk_ids: List[str],
+        timeout: int = 60,
+        on_ready: Optional[Callable[[str, str], None]] = None,
+        on_error: Optional[Callable[[str, str], None]] = None
+    ) -> Dict[str, str]:
+        """
+        Poll a batch of talks from a single coroutine until every video is ready.
+        
+        Each round issues the status GETs for all pending talks concurrently,
+        then backs off exponentially with jitter; a status request that fails
+        is simply retried next round. on_ready(talk_id, result_url) is called
+        as soon as an individual talk is done. A talk that fails raises,
+        unless on_error(talk_id, error) is given, in which case the talk is
+        reported there and dropped from the batch.
+        
+        Returns:
+            dict: Result URL for every talk ID that finished
+        """
+        pending = list(dict.fromkeys(talk_ids))
+        results = {}
+        
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+        delay = 0.5
+        failed = set()
+        while pending and loop.time() - start_time < timeout:
+            talks = await asyncio.gather(
+                *[self._aget_talk(session, talk_id) for talk_id in pending],
+                return_exceptions=True
+            )
+            for talk_id, talk in zip(pending, talks):
+                if isinstance(talk, Exception):
+                    continue
+                if talk["status"] == "done":
+                    results[talk_id] = talk["result_url"]
+                    if on_ready:
+                        on_ready(talk_id, talk["result_url"])
+                elif talk["status"] == "error":
+                    error = talk.get('error', 'Unknown error')
+                    if not on_error:
+                        raise Exception(f"Error creating video: {error}")
+                    on_error(talk_id, error)
+                    failed.add(talk_id)
+            
+            pending = [talk_id for talk_id in pending if talk_id not in results and talk_id not in failed]
+            if pending:
+                await asyncio.sleep(delay + random.uniform(0, 0.25))
+                delay = min(8.0, delay * 1.5)
+        
+        if pending:
+            raise TimeoutError("Timeout waiting for video creation")
+        return results
+    
+    async def _adownload_video(self, session: aiohttp.ClientSession, url: str, output_path: str):
+        """Asynchronously stream the video from URL to the specified path"""
+        async with session.get(url) as response:
+            response.raise_for_status()
+            with open(output_path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(65536):
+                    f.write(chunk)
@@ -0,0 +1,194 @@
+import os
+import subprocess
+import tempfile
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from moviepy.config import get_setting
+
+# Use the same ffmpeg binary MoviePy resolved (system ffmpeg or imageio's bundled build)
+FFMPEG_BINARY = get_setting("FFMPEG_BINARY")
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
+
+def run_ffmpeg(args: List[str], input: Optional[Union[bytes, Iterable[bytes]]] = None) -> None:
+    """
+    Run ffmpeg with the given arguments, overwriting any existing output.
+    
+    Args:
+        args: Command line arguments following the ffmpeg binary
+        input: Optional bytes, or an iterable of byte chunks streamed one at
+            a time, to feed to ffmpeg's stdin
+        
+    Raises:
+        RuntimeError: If ffmpeg exits with a non-zero status
+    """
+    # Collect stderr in a file so a chatty ffmpeg can't block while we write stdin
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            [FFMPEG_BINARY, "-y", "-hide_banner", "-loglevel", "error", *args],
+            stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr
+        )
+        if input is not None:
+            try:
+                for chunk in ([input] if isinstance(input, bytes) else input):
+                    process.stdin.write(chunk)
+            except BrokenPipeError:
+                # ffmpeg exited early; its stderr explains why
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+        
+        if process.wait() != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"ffmpeg failed: {stderr.read().decode(errors='replace').strip()}")
+
+def probe_duration(path: str) -> float:
+    """Read a media file's duration in seconds from its container metadata"""
+    output = subprocess.check_output([
+        FFPROBE_BINARY, "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=nw=1:nk=1",
+        path
+    ])
+    return float(output)
+
+def probe_stream(path: str, stream: str, fields: Sequence[str]) -> Dict[str, str]:
+    """
+    Read some fields of one stream of a media file.
+    
+    Args:
+        path: Media file to probe
+        stream: ffprobe stream specifier, e.g. "v:0" or "a:0"
+        fields: Stream fields to read, e.g. ("codec_name", "sample_rate")
+        
+    Returns:
+        dict: Value of each field that the stream has
+    """
+    output = subprocess.check_output([
+        FFPROBE_BINARY, "-v", "error",
+        "-select_streams", stream,
+        "-show_entries", "stream=" + ",".join(fields),
+        "-of", "default=nw=1",
+        path
+    ])
+    return dict(line.split("=", 1) for line in output.decode().splitlines() if "=" in line)
+
+def _concat_entry(path: str) -> str:
+    """Quote a path for an ffconcat list"""
+    return "file '" + os.path.abspath(path).replace("'", "'\\''") + "'"
+
+def render_slideshow(
+    slides: Sequence[Union[str, np.ndarray]],
+    audio_paths: Sequence[str],
+    output_path: str,
+    avatar_paths: Optional[Sequence[Optional[str]]] = None,
+    durations: Optional[Sequence[float]] = None,
+    avatar_width: int = 480,
+    avatar_position: Tuple[str, str] = ("W-w-50", "50"),
+    fps: int = 30,
+    video_codec: Optional[List[str]] = None
+) -> str:
+    """
+    Render a whole presentation with a single ffmpeg invocation.
+    
+    Slide images are fed through the concat demuxer, each held for the length
+    of its narration, the narrations are joined with the concat filter and
+    each slide's avatar (if any) is overlaid only while that slide is shown.
+    Slides already in memory as RGB arrays are piped to ffmpeg as raw frames
+    instead, one frame per slide, skipping the image encode/decode round trip.
+    
+    Args:
+        slides: Slide image path, or HxWx3 uint8 RGB array, for each slide
+        audio_paths: Narration for each slide
+        output_path: Path where the video will be saved
+        avatar_paths: Optional avatar video for each slide (None to skip a slide)
+        durations: Length of each slide in seconds; probed from the audio if omitted
+        avatar_width: Width in pixels the avatars are scaled to
+        avatar_position: ffmpeg overlay x/y expressions for the avatar
+        fps: Output frame rate
+        video_codec: ffmpeg video encoder arguments (libx264 veryfast by default)
+        
+    Returns:
+        str: Path to the generated video
+    """
+    if durations is None:
+        durations = [probe_duration(audio_path) for audio_path in audio_paths]
+    if avatar_paths is None:
+        avatar_paths = [None] * len(slides)
+    
+    starts = np.concatenate(([0.0], np.cumsum(durations)[:-1])).tolist()
+    concat_list = None
+    frames = None
+    if isinstance(slides[0], np.ndarray):
+        # One raw frame per slide, re-timestamped to each slide's start time, and
+        # fps fills the gaps; like the concat list, the last slide is sent twice
+        # (stamped at the very end) so it is held for its full duration. The
+        # timebase is switched to milliseconds first, since in the 1 fps input
+        # timebase setpts would round every start down to a whole second
+        height, width = slides[0].shape[:2]
+        inputs = ["-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-framerate", "1", "-i", "-"]
+        frame_starts = starts + [starts[-1] + durations[-1]]
+        pts = "+".join(f"{start:.3f}*eq(N,{i})" for i, start in enumerate(frame_starts) if start) or "0"
+        filters = [f"[0:v]settb=1/1000,setpts='({pts})/TB',fps={fps}[v0]"]
+        frames = (
+            memoryview(np.ascontiguousarray(slide, dtype=np.uint8))
+            for slide in list(slides) + [slides[-1]]
+        )
+    else:
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as concat_file:
+            concat_file.write("ffconcat version 1.0\n")
+            for image_path, duration in zip(slides, durations):
+                concat_file.write(f"{_concat_entry(image_path)}\nduration {duration:.3f}\n")
+            # The concat demuxer ignores the last duration unless the final file is repeated
+            concat_file.write(f"{_concat_entry(slides[-1])}\n")
+        concat_list = concat_file.name
+        inputs = ["-f", "concat", "-safe", "0", "-i", concat_list]
+        filters = [f"[0:v]fps={fps}[v0]"]
+    
+    for audio_path in audio_paths:
+        inputs += ["-i", audio_path]
+    
+    # Overlay each avatar, trimmed to its slide and shifted to the slide's start time,
+    # only while its slide is shown; untrimmed, a long last avatar would keep the
+    # video running past the narration
+    video_label = "v0"
+    input_index = 1 + len(audio_paths)
+    for i, (avatar_path, start, duration) in enumerate(zip(avatar_paths, starts, durations)):
+        end = start + duration
+        if avatar_path:
+            inputs += ["-i", avatar_path]
+            filters.append(
+                f"[{input_index}:v]trim=duration={duration:.3f},scale={avatar_width}:-2,"
+                f"setpts=PTS-STARTPTS+{start:.3f}/TB[av{i}]"
+            )
+            filters.append(
+                f"[{video_label}][av{i}]overlay=x={avatar_position[0]}:y={avatar_position[1]}"
+                f":enable='between(t,{start:.3f},{end:.3f})'[ov{i}]"
+            )
+            video_label = f"ov{i}"
+            input_index += 1
+    filters.append(f"[{video_label}]format=yuv420p[v]")
+    filters.append(
+        "".join(f"[{i + 1}:a]" for i in range(len(audio_paths)))
+        + f"concat=n={len(audio_paths)}:v=0:a=1[a]"
+    )
+    
+    try:
+        run_ffmpeg(inputs + [
+            "-filter_complex", ";".join(filters),
+            "-map", "[v]", "-map", "[a]",
+            *(video_codec or ["-c:v", "libx264", "-preset", "veryfast"]),
+            "-pix_fmt", "yuv420p", "-r", str(fps),
+            "-c:a", "aac", "-b:a", "128k",
+            "-movflags", "+faststart",
+            output_path
+        ], input=frames)
+    finally:
+        if concat_list:
+            os.remove(concat_list)
+    
+    return output_path
@@ -1,14 +1,35 @@
 import os
-import cv2
+import asyncio
+import hashlib
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache, partial
 import numpy as np
-from moviepy.editor import ImageClip, VideoFileClip, AudioFileClip, CompositeVideoClip, concatenate_videoclips
 from PIL import Image, ImageDraw, ImageFont
 import tempfile
 from pptx import Presentation
 from gtts import gTTS
+import edge_tts
+import pyttsx3
 import azure.cognitiveservices.speech as speechsdk
-from avatar_generator import create_avatar_video
+from avatar_generator import create_avatar_videos
+from ffmpeg_utils import render_slideshow
 import io
+import psutil
+
+# Each in-flight slide render holds a full-resolution canvas plus decoded
+# pictures; bound concurrent renders by free memory rather than slide count
+_RENDER_MEMORY_PER_SLIDE = 8 * 1024 * 1024
+_RENDER_SEM = threading.BoundedSemaphore(max(1, psutil.virtual_memory().available // _RENDER_MEMORY_PER_SLIDE))
+
+@lru_cache(maxsize=64)
+def _get_font(size):
+    """Load Arial at the given size, parsing each TTF/size pair only once"""
+    try:
+        return ImageFont.truetype("arial.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
 
 def extract_text_from_slide(slide):
     """Extract text content from a PowerPoint slide with better formatting"""
@@ -29,131 +50,277 @@ def extract_text_from_slide(slide):
     
     return " ".join(text_content)
 
-def extract_text_from_slides(ppt_path):
-    """Extract text from all slides in the presentation"""
-    prs = Presentation(ppt_path)
+def extract_text_from_slides(prs):
+    """Extract text from all slides in an already loaded presentation"""
     texts = []
     for slide in prs.slides:
         texts.append(extract_text_from_slide(slide))
     return texts
 
-def convert_slide_to_image(ppt_path, slide_index, output_path, size=(1920, 1080)):
-    """Convert a PowerPoint slide to an image using python-pptx and PIL"""
+def _wrap_text(text, font, max_width):
+    """
+    Greedily wrap text into lines no wider than max_width.
+    
+    Every word is measured once with font.getlength (no ImageDraw needed) and
+    line widths are accumulated from the per-word widths, so wrapping costs
+    O(words) font measurements.
+    Returns a list of (line, line_width) tuples.
+    """
+    words = text.split()
+    word_widths = [font.getlength(word) for word in words]
+    space_width = font.getlength(" ")
+    
+    lines = []
+    current_line = []
+    line_width = 0
+    for word, word_width in zip(words, word_widths):
+        candidate_width = line_width + space_width + word_width if current_line else word_width
+        if current_line and candidate_width > max_width:
+            lines.append((' '.join(current_line), line_width))
+            current_line = [word]
+            line_width = word_width
+        else:
+            current_line.append(word)
+            line_width = candidate_width
+    
+    if current_line:
+        lines.append((' '.join(current_line), line_width))
+    
+    return lines
+
+def convert_slide_to_image(slide, slide_index, output_path, size=(1920, 1080), return_array=False):
+    """
+    Convert an already loaded PowerPoint slide to an image using PIL
+    
+    The directory of output_path must already exist; process_presentation
+    creates it once before rendering any slide. Slides are always written as
+    lightly compressed PNG, since they are decoded again straight away.
+    With return_array=True nothing is written and the rendered RGB pixels are
+    returned as a numpy array instead of the path.
+    """
+    output_path = os.path.splitext(output_path)[0] + ".png"
     try:
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # Load the presentation
-        prs = Presentation(ppt_path)
-        
-        # Get the slide
-        slide = prs.slides[slide_index]
-        
-        # Create a blank image with white background
-        img = Image.new('RGB', size, color='white')
-        draw = ImageDraw.Draw(img)
-        
-        # Process each shape in the slide
-        for shape in slide.shapes:
-            # Get shape position and size
-            left = int(shape.left * size[0] / 9144000)  # Convert EMU to pixels
-            top = int(shape.top * size[1] / 6858000)
-            width = int(shape.width * size[0] / 9144000)
-            height = int(shape.height * size[1] / 6858000)
+        # Create a blank image with white background, released as soon as it is saved
+        with Image.new('RGB', size, color='white') as img:
+            draw = ImageDraw.Draw(img)
             
-            # Handle different shape types
-            if shape.shape_type == 13:  # Picture
-                try:
-                    image_stream = io.BytesIO(shape.image.blob)
-                    pil_image = Image.open(image_stream)
-                    pil_image = pil_image.resize((width, height), Image.Resampling.LANCZOS)
-                    img.paste(pil_image, (left, top))
-                except Exception as e:
-                    print(f"Error processing image: {str(e)}")
+            # Convert every shape's position and size from EMU to pixels in one go
+            shapes = list(slide.shapes)
+            extents = np.array(
+                [(shape.left or 0, shape.top or 0, shape.width or 0, shape.height or 0) for shape in shapes],
+                dtype=np.int64
+            ).reshape(-1, 4)
+            pixel_extents = extents * np.array([size[0], size[1], size[0], size[1]]) // np.array([9144000, 6858000, 9144000, 6858000])
             
-            elif hasattr(shape, "text") and shape.text.strip():
-                # Handle text with proper formatting
-                text = shape.text.strip()
-                
-                # Determine if it's a title
-                is_title = hasattr(shape, "is_title") and shape.is_title
-                
-                # Set font size based on whether it's a title and shape size
-                if is_title:
-                    font_size = int(min(width, height) / 15)
-                else:
-                    font_size = int(min(width, height) / 25)
-                
-                try:
-                    font = ImageFont.truetype("arial.ttf", font_size)
-                except:
-                    font = ImageFont.load_default()
+            # Process each shape in the slide
+            for shape, (left, top, width, height) in zip(shapes, pixel_extents.tolist()):
                 
-                # Draw text with word wrap
-                words = text.split()
-                lines = []
-                current_line = []
+                # Handle different shape types
+                if shape.shape_type == 13:  # Picture
+                    try:
+                        with Image.open(io.BytesIO(shape.image.blob)) as pil_image:
+                            resized_image = pil_image.resize((width, height), Image.Resampling.LANCZOS)
+                        img.paste(resized_image, (left, top))
+                        resized_image.close()
+                    except Exception as e:
+                        print(f"Error processing image: {str(e)}")
                 
-                for word in words:
-                    current_line.append(word)
-                    line_text = ' '.join(current_line)
-                    text_width = draw.textlength(line_text, font=font)
+                elif hasattr(shape, "text") and shape.text.strip():
+                    # Handle text with proper formatting
+                    text = shape.text.strip()
                     
-                    if text_width > width - 20:  # Leave some padding
-                        current_line.pop()
-                        lines.append(' '.join(current_line))
-                        current_line = [word]
-                
-                if current_line:
-                    lines.append(' '.join(current_line))
-                
-                # Draw each line with proper spacing
-                y = top
-                line_height = font_size + 5
-                for line in lines:
-                    # Center text if it's a title
+                    # Determine if it's a title
+                    is_title = hasattr(shape, "is_title") and shape.is_title
+                    
+                    # Set font size based on whether it's a title and shape size
                     if is_title:
-                        text_width = draw.textlength(line, font=font)
-                        x = left + (width - text_width) / 2
+                        font_size = int(min(width, height) / 15)
                     else:
-                        x = left + 10
+                        font_size = int(min(width, height) / 25)
+                    
+                    font = _get_font(font_size)
+                    
+                    # Draw text with word wrap, leaving some padding
+                    lines = _wrap_text(text, font, width - 20)
                     
-                    draw.text((x, y), line, font=font, fill='black')
-                    y += line_height
+                    # Draw each line with proper spacing
+                    y = top
+                    line_height = font_size + 5
+                    for line, text_width in lines:
+                        # Center text if it's a title
+                        if is_title:
+                            x = left + (width - text_width) / 2
+                        else:
+                            x = left + 10
+                        
+                        draw.text((x, y), line, font=font, fill='black')
+                        y += line_height
+                
+                elif shape.shape_type == 1:  # Rectangle or other shape
+                    try:
+                        # Draw shape outline
+                        draw.rectangle([left, top, left + width, top + height], 
+                                     outline='black', width=2)
+                    except Exception as e:
+                        print(f"Error drawing shape: {str(e)}")
             
-            elif shape.shape_type == 1:  # Rectangle or other shape
-                try:
-                    # Draw shape outline
-                    draw.rectangle([left, top, left + width, top + height], 
-                                 outline='black', width=2)
-                except Exception as e:
-                    print(f"Error drawing shape: {str(e)}")
-        
-        # Save the image with high quality
-        img.save(output_path, quality=95)
+            if return_array:
+                return np.asarray(img)
+            
+            # Save losslessly with fast zlib settings
+            img.save(output_path, format="PNG", compress_level=1, optimize=False)
         return output_path
         
     except Exception as e:
         print(f"Error converting slide {slide_index}: {str(e)}")
         # Create a blank slide with error message
-        img = Image.new('RGB', size, color='white')
-        draw = ImageDraw.Draw(img)
-        try:
-            font = ImageFont.truetype("arial.ttf", 40)
-        except:
-            font = ImageFont.load_default()
-        draw.text((size[0]/2, size[1]/2), f"Slide {slide_index + 1}", font=font, fill='black', anchor="mm")
-        img.save(output_path)
+        with Image.new('RGB', size, color='white') as img:
+            draw = ImageDraw.Draw(img)
+            font = _get_font(40)
+            draw.text((size[0]/2, size[1]/2), f"Slide {slide_index + 1}", font=font, fill='black', anchor="mm")
+            if return_array:
+                return np.asarray(img)
+            img.save(output_path, format="PNG", compress_level=1, optimize=False)
         return output_path
 
-def generate_audio_from_text(text, output_path, voice_type="female", speech_rate=1.0, speech_pitch=0):
-    """Generate audio from text using gTTS"""
-    try:
+# Neural voices used by the edge-tts backend
+EDGE_VOICES = {
+    "female": "en-US-JennyNeural",
+    "male": "en-US-GuyNeural"
+}
+
+# Maximum number of edge-tts requests in flight at once, to avoid being throttled
+EDGE_MAX_CONCURRENT = 8
+
+_PYTTSX3_LOCK = threading.Lock()
+
+# Narrations are cached here across runs; the least recently used ones are
+# removed once the cache grows past _TTS_CACHE_MAX_BYTES
+_TTS_CACHE_DIR = os.path.join(tempfile.gettempdir(), "pptvideo_tts")
+_TTS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+async def _synthesize_edge(text, output_path, voice_type="female", speech_rate=1.0, speech_pitch=0):
+    """Stream narration from Microsoft's edge-tts endpoint into output_path"""
+    communicate = edge_tts.Communicate(
+        text,
+        EDGE_VOICES.get(voice_type.lower(), EDGE_VOICES["female"]),
+        rate=f"{round((speech_rate - 1) * 100):+d}%",
+        pitch=f"{int(speech_pitch):+d}Hz"
+    )
+    await communicate.save(output_path)
+
+async def _synthesize_edge_batch(texts, output_paths, voice_type="female", speech_rate=1.0, speech_pitch=0):
+    """
+    Run the edge-tts syntheses concurrently on one event loop, at most
+    EDGE_MAX_CONCURRENT at a time, returning each one's exception (or None)
+    """
+    semaphore = asyncio.Semaphore(EDGE_MAX_CONCURRENT)
+    
+    async def synthesize(text, output_path):
+        async with semaphore:
+            await _synthesize_edge(text, output_path, voice_type, speech_rate, speech_pitch)
+    
+    return await asyncio.gather(*[
+        synthesize(text, output_path) for text, output_path in zip(texts, output_paths)
+    ], return_exceptions=True)
+
+def _synthesize_pyttsx3(text, output_path, speech_rate=1.0):
+    """Synthesize narration offline with the platform speech engine"""
+    # The underlying speech engines are not thread-safe
+    with _PYTTSX3_LOCK:
+        engine = pyttsx3.init()
+        engine.setProperty("rate", int(engine.getProperty("rate") * speech_rate))
+        engine.save_to_file(text, output_path)
+        engine.runAndWait()
+
+def _synthesize(text, output_path, voice_type="female", speech_rate=1.0, speech_pitch=0, backend="gtts"):
+    """Synthesize narration with the selected backend, raising on failure"""
+    if backend == "edge":
+        asyncio.run(_synthesize_edge(text, output_path, voice_type, speech_rate, speech_pitch))
+    elif backend == "pyttsx3":
+        _synthesize_pyttsx3(text, output_path, speech_rate)
+    else:
         # Use gTTS for text-to-speech
         lang = "en"
         tld = "com" if voice_type.lower() == "female" else "co.uk"
         tts = gTTS(text=text, lang=lang, tld=tld, slow=(speech_rate < 1.0))
         tts.save(output_path)
+
+def _prune_tts_cache():
+    """Remove the least recently used narrations until the cache fits in _TTS_CACHE_MAX_BYTES"""
+    entries = []
+    for entry in os.scandir(_TTS_CACHE_DIR):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= _TTS_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def _tts_cache_path(text, voice_type, speech_rate, speech_pitch, backend):
+    """Path of a narration in the TTS cache, keyed by everything that affects the audio"""
+    key = hashlib.sha1(repr((text, voice_type, speech_rate, speech_pitch, backend)).encode()).hexdigest()
+    return os.path.join(_TTS_CACHE_DIR, f"{key}.mp3")
+
+def _tts_cache_hit(cache_path):
+    """Whether a narration is still cached, marking it as recently used so pruning keeps it"""
+    try:
+        os.utime(cache_path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def _tts_cache_tmp_path():
+    """
+    A private file in the TTS cache to synthesize into before it is renamed
+    into place, so concurrent misses never interleave writes
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix=".mp3", dir=_TTS_CACHE_DIR)
+    os.close(fd)
+    return tmp_path
+
+def _cached_narration(text, voice_type, speech_rate, speech_pitch, backend):
+    """
+    Synthesize narration into the shared TTS cache and return its path
+    
+    Repeated or re-ordered slides reuse earlier results. A cached file that
+    has since been deleted is simply synthesized again. Failures raise and
+    are therefore not cached.
+    """
+    os.makedirs(_TTS_CACHE_DIR, exist_ok=True)
+    cache_path = _tts_cache_path(text, voice_type, speech_rate, speech_pitch, backend)
+    if _tts_cache_hit(cache_path):
+        return cache_path
+    
+    tmp_path = _tts_cache_tmp_path()
+    try:
+        _synthesize(text, tmp_path, voice_type, speech_rate, speech_pitch, backend)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _prune_tts_cache()
+    return cache_path
+
+def generate_audio_from_text(text, output_path, voice_type="female", speech_rate=1.0, speech_pitch=0, backend="gtts"):
+    """
+    Generate audio from text
+    
+    backend selects the speech engine: "gtts" (Google Translate TTS),
+    "edge" (Microsoft edge-tts) or "pyttsx3" (offline, no network hops).
+    Identical narrations are synthesized only once while they stay in the cache.
+    """
+    try:
+        shutil.copyfile(_cached_narration(text, voice_type, speech_rate, speech_pitch, backend), output_path)
         return output_path
             
     except Exception as e:
@@ -166,67 +333,186 @@ def generate_audio_from_text(text, output_path, voice_type="female", speech_rate
         silent_clip.write_audiofile(output_path)
         return output_path
 
-def create_final_video(image_paths, audio_paths, avatar_paths, output_path):
-    """Combine slides, audio, and avatars into final video"""
-    clips = []
-    for img_path, audio_path, avatar_path in zip(image_paths, audio_paths, avatar_paths):
-        # Load components
-        slide_clip = ImageClip(img_path)
-        audio_clip = AudioFileClip(audio_path)
-        avatar_clip = VideoFileClip(avatar_path)
+def generate_audio_batch(texts, output_paths, voice_type="female", speech_rate=1.0, speech_pitch=0, backend="edge"):
+    """
+    Generate narration for several texts at once
+    
+    Narrations already in the TTS cache are reused. The missing edge-tts
+    narrations are requested concurrently on a single event loop; only the
+    texts whose request failed (e.g. no network) fall back to offline
+    pyttsx3. Other backends are synthesized one text at a time.
+    """
+    if backend == "edge":
+        os.makedirs(_TTS_CACHE_DIR, exist_ok=True)
+        cache_paths = [
+            _tts_cache_path(text, voice_type, speech_rate, speech_pitch, backend) for text in texts
+        ]
         
-        # Set durations
-        slide_clip = slide_clip.set_duration(audio_clip.duration)
-        avatar_clip = avatar_clip.set_duration(audio_clip.duration)
+        # Each distinct narration missing from the cache is synthesized once
+        misses = {}
+        for text, cache_path in zip(texts, cache_paths):
+            if cache_path not in misses and not _tts_cache_hit(cache_path):
+                misses[cache_path] = text
+        tmp_paths = [_tts_cache_tmp_path() for _ in misses]
+        errors = asyncio.run(_synthesize_edge_batch(
+            list(misses.values()), tmp_paths, voice_type, speech_rate, speech_pitch
+        ))
+        failed = {}
+        for cache_path, tmp_path, error in zip(misses, tmp_paths, errors):
+            if error is None:
+                os.replace(tmp_path, cache_path)
+            else:
+                os.remove(tmp_path)
+                failed[cache_path] = error
         
-        # Position avatar in bottom right
-        avatar_clip = avatar_clip.resize(width=slide_clip.w // 4)
-        avatar_clip = avatar_clip.set_position((slide_clip.w - avatar_clip.w - 50, 50))
+        for text, cache_path, output_path in zip(texts, cache_paths, output_paths):
+            if cache_path in failed:
+                print(f"Error in edge-tts, falling back to pyttsx3: {str(failed[cache_path])}")
+                generate_audio_from_text(text, output_path, voice_type, speech_rate, speech_pitch, "pyttsx3")
+            else:
+                shutil.copyfile(cache_path, output_path)
         
-        # Combine clips
-        final_clip = CompositeVideoClip([slide_clip, avatar_clip])
-        final_clip = final_clip.set_audio(audio_clip)
-        clips.append(final_clip)
+        # Pruned only once every result has been copied out of the cache
+        if misses:
+            _prune_tts_cache()
+        return list(output_paths)
+    
+    return [
+        generate_audio_from_text(text, output_path, voice_type, speech_rate, speech_pitch, backend)
+        for text, output_path in zip(texts, output_paths)
+    ]
+
+def create_final_video(slides, audio_paths, avatar_paths, output_path):
+    """
+    Combine slides, audio, and avatars into final video with a single ffmpeg pass
+    
+    slides holds either slide image paths or in-memory RGB arrays.
+    """
+    if isinstance(slides[0], np.ndarray):
+        slide_width = slides[0].shape[1]
+    else:
+        with Image.open(slides[0]) as first_slide:
+            slide_width = first_slide.width
     
-    # Concatenate all clips
-    final_video = concatenate_videoclips(clips)
-    final_video.write_videofile(output_path, fps=30)
-    return output_path
+    # Avatar takes a quarter of the slide width in the top right corner
+    return render_slideshow(
+        slides,
+        audio_paths,
+        output_path,
+        avatar_paths=avatar_paths,
+        avatar_width=slide_width // 4,
+        avatar_position=("W-w-50", "50"),
+        fps=30
+    )
+
+def _render_slide(slide, slide_index, text, work_dir, voice_type="female", speech_rate=1.0, speech_pitch=0,
+                  tts_backend="gtts", in_memory=False):
+    """
+    Render the image (a path, or an RGB array when in_memory) and narration for a single slide
+    
+    With the batched edge-tts backend the narration is produced separately,
+    so only the image is rendered and the audio path is None.
+    """
+    with _RENDER_SEM:
+        image = convert_slide_to_image(
+            slide, slide_index, os.path.join(work_dir, f"slide_{slide_index}.png"), return_array=in_memory
+        )
+    if tts_backend == "edge":
+        return image, None
+    audio_path = generate_audio_from_text(
+        text, os.path.join(work_dir, f"audio_{slide_index}.mp3"), voice_type, speech_rate, speech_pitch, tts_backend
+    )
+    return image, audio_path
 
-def process_presentation(ppt_path, output_path, voice_type="female", language="en", tld="com", speech_rate=1.0, speech_pitch=0):
+def process_presentation(ppt_path, output_path, voice_type="female", language="en", tld="com", speech_rate=1.0, speech_pitch=0,
+                         avatar_style="default", did_api_key=None, tts_backend="gtts", progress_callback=None,
+                         slide_texts=None):
     """
     Process the entire presentation with enhanced features
+    
+    Talking avatars are only added when a D-ID API key is given; the talks for
+    all slides are then created as one batch alongside the slide rendering.
+    tts_backend selects the speech engine (see generate_audio_from_text); the
+    edge-tts backend synthesizes all slides as one concurrent batch.
+    If given, progress_callback(completed, total) is called from the calling
+    thread each time a slide finishes rendering. slide_texts may be passed in
+    when the caller has already extracted (and cached) them.
     """
     try:
-        # Extract text from slides
-        slide_texts = extract_text_from_slides(ppt_path)
+        # Parse the presentation once and share the slides with every stage
+        prs = Presentation(ppt_path)
+        slides = list(prs.slides)
+        
+        # Extract text from slides unless the caller already has it
+        if slide_texts is None:
+            slide_texts = extract_text_from_slides(prs)
+        elif len(slide_texts) != len(slides):
+            raise ValueError("slide_texts does not match the number of slides")
+        if not slide_texts:
+            raise ValueError("The presentation does not contain any slides")
         
-        # Convert slides to images
-        image_paths = []
-        for i in range(len(slide_texts)):
-            image_path = convert_slide_to_image(ppt_path, i)
-            if image_path:
-                image_paths.append(image_path)
+        # Intermediate slide images, audio and avatars live next to the output;
+        # create the directory once here rather than once per slide
+        work_dir = os.path.join(os.path.dirname(os.path.abspath(output_path)), "temp")
+        os.makedirs(work_dir, exist_ok=True)
         
-        # Generate audio for each slide
-        audio_paths = []
-        for text in slide_texts:
-            audio_path = generate_audio_from_text(text, voice_type, language, tld, speech_rate, speech_pitch)
-            if audio_path:
-                audio_paths.append(audio_path)
+        # Keep rendered slides in memory and pipe them straight to ffmpeg when
+        # they comfortably fit, skipping a PNG encode and decode per slide
+        in_memory = len(slides) * _RENDER_MEMORY_PER_SLIDE < psutil.virtual_memory().available // 4
+        
+        # Slides are independent and dominated by network I/O (gTTS, D-ID),
+        # so render them concurrently while preserving slide order
+        render = partial(
+            _render_slide,
+            work_dir=work_dir,
+            voice_type=voice_type,
+            speech_rate=speech_rate,
+            speech_pitch=speech_pitch,
+            tts_backend=tts_backend,
+            in_memory=in_memory
+        )
+        results = [None] * len(slides)
+        avatar_paths = [None] * len(slides)
+        # Two extra workers for the D-ID and edge-tts batches
+        with ThreadPoolExecutor(max_workers=min(16, len(slide_texts)) + 2) as executor:
+            if did_api_key:
+                avatar_future = executor.submit(
+                    create_avatar_videos,
+                    slide_texts,
+                    [os.path.join(work_dir, f"avatar_{i}.mp4") for i in range(len(slides))],
+                    avatar_style,
+                    did_api_key
+                )
+            if tts_backend == "edge":
+                audio_future = executor.submit(
+                    generate_audio_batch,
+                    slide_texts,
+                    [os.path.join(work_dir, f"audio_{i}.mp3") for i in range(len(slides))],
+                    voice_type,
+                    speech_rate,
+                    speech_pitch
+                )
+            
+            futures = {
+                executor.submit(render, slide, i, text): i
+                for i, (slide, text) in enumerate(zip(slides, slide_texts))
+            }
+            for completed, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                if progress_callback:
+                    progress_callback(completed, len(slides))
         
-        # Create avatar videos for each slide
-        avatar_paths = []
-        for text in slide_texts:
-            avatar_path = create_avatar_video(text, voice_type)
-            if avatar_path:
-                avatar_paths.append(avatar_path)
+        slide_images, audio_paths = (list(items) for items in zip(*results))
+        if did_api_key:
+            avatar_paths = avatar_future.result()
+        if tts_backend == "edge":
+            audio_paths = audio_future.result()
         
         # Create final video
-        create_final_video(image_paths, audio_paths, avatar_paths, output_path)
+        create_final_video(slide_images, audio_paths, avatar_paths, output_path)
         
         return output_path
         
     except Exception as e:
         print(f"Error processing presentation: {str(e)}")
-        return None 
\ No newline at end of file
+        return None
@@ -1,106 +1,500 @@
 import os
-import cv2
-import numpy as np
-from moviepy.editor import ImageClip, VideoFileClip, AudioFileClip, CompositeVideoClip, concatenate_videoclips
-from PIL import Image
-import tempfile
-from avatar_generator import create_avatar_video
+import shutil
+import asyncio
+import threading
+import multiprocessing
+import aiohttp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from avatar_generator import create_avatar_video, DID_PRESENTERS
+from did_avatar import DIDAvatar, DID_MAX_CONCURRENT
+from ffmpeg_utils import run_ffmpeg, probe_duration, probe_stream, render_slideshow, _concat_entry
+
+# Video stream parameters that must match for slide videos to be stream-copied together
+VIDEO_STREAM_FIELDS = ("codec_name", "profile", "width", "height", "pix_fmt", "r_frame_rate")
+AUDIO_STREAM_FIELDS = ("codec_name", "sample_rate", "channels", "channel_layout")
+
+# Concurrent NVENC encodes allowed on consumer NVIDIA cards
+NVENC_MAX_SESSIONS = 3
+
+def _init_worker(worker_counter, parallelism):
+    """
+    Pin a worker process to its own slice of the available CPUs, so parallel
+    encodes don't contend for the same cores; the ffmpeg processes it
+    starts inherit the affinity.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    with worker_counter.get_lock():
+        worker = worker_counter.value
+        worker_counter.value += 1
+    cpus = sorted(os.sched_getaffinity(0))
+    per_worker = max(1, len(cpus) // parallelism)
+    start = (worker % parallelism) * per_worker
+    os.sched_setaffinity(0, cpus[start:start + per_worker])
+
+def _render_slide(args):
+    """
+    Render a single slide (avatar, slide image and narration) to its own video.
+    
+    Runs in a worker process, so everything it needs is passed in args.
+    
+    Args:
+        args: (generator, slide_path, text, audio_path, index, avatar_style, avatar_video_path),
+            where avatar_video_path is an already created avatar (possibly shared
+            with other slides), or None to create a simple avatar here;
+            avatar_style "none" renders the slide without an avatar
+        
+    Returns:
+        str: Path to the slide video, or None if the slide failed
+    """
+    generator, slide_path, text, audio_path, i, avatar_style, avatar_video_path = args
+    try:
+        # Get audio duration from the container metadata
+        duration = probe_duration(audio_path)
+        
+        # Create avatar video
+        own_avatar = not avatar_video_path and avatar_style != "none"
+        if own_avatar:
+            avatar_video_path = os.path.join(generator.temp_dir, f"avatar_{i}.mp4")
+            generator.create_avatar_video(text, duration, avatar_video_path, avatar_style)
+        
+        # Create final video for this slide
+        slide_video_path = os.path.join(generator.temp_dir, f"slide_{i}_final.mkv")
+        try:
+            generator.combine_slide_and_avatar(
+                slide_path,
+                avatar_video_path,
+                audio_path,
+                slide_video_path,
+                duration
+            )
+        except RuntimeError as e:
+            if not generator.has_nvenc():
+                raise
+            # The GPU may refuse yet another encode session, so redo the slide with x264
+            print(f"NVENC encode of slide {i+1} failed, retrying with x264: {str(e)}")
+            generator.combine_slide_and_avatar(
+                slide_path,
+                avatar_video_path,
+                audio_path,
+                slide_video_path,
+                duration,
+                nvenc=False
+            )
+        
+        # The avatar is baked into the slide video now, so free its disk space
+        # early (avatars passed in are removed by the parent once every slide
+        # using them is done)
+        if own_avatar:
+            os.remove(avatar_video_path)
+        return slide_video_path
+        
+    except Exception as e:
+        print(f"Error processing slide {i+1}: {str(e)}")
+        return None
 
 class VideoGenerator:
     def __init__(self, output_dir):
         self.output_dir = output_dir
+        # Created when slides are processed, and removed again afterwards
         self.temp_dir = os.path.join(output_dir, "temp")
-        os.makedirs(self.temp_dir, exist_ok=True)
         
         # Video settings
         self.slide_size = (1920, 1080)
         self.avatar_size = (640, 360)
         self.slide_position = (0, 0)
-        self.avatar_position = (self.slide_size[0] - self.avatar_size[0] - 50, 50)
+        # Avatar at 1/4 of the slide width, bottom right with 50px padding (ffmpeg overlay x/y)
+        self.avatar_width = self.slide_size[0] // 4
+        self.avatar_position = ("W-w-50", "H-h-50")
+        
+        # Whether ffmpeg can encode with NVENC, probed on first use
+        self._nvenc = None
         
     def create_avatar_video(self, text, duration, output_path, avatar_style="professional", did_api_key=None):
         """Create a video with an avatar speaking the text"""
-        return create_avatar_video(text, duration, output_path, avatar_style, did_api_key)
+        return create_avatar_video(
+            text,
+            output_path,
+            avatar_style=avatar_style,
+            did_api_key=did_api_key,
+            duration=duration
+        )
     
-    def combine_slide_and_avatar(self, slide_path, avatar_video_path, audio_path, output_path, slide_duration=10):
-        """Combine slide, avatar video, and audio into final video"""
-        # Load components
-        slide_clip = ImageClip(slide_path).set_duration(slide_duration)
-        avatar_clip = VideoFileClip(avatar_video_path)
-        audio_clip = AudioFileClip(audio_path)
-        
-        # Resize avatar to be proportional to slide
-        avatar_clip = avatar_clip.resize(width=slide_clip.w // 4)  # 1/4 of slide width
-        
-        # Position avatar in bottom right with padding
-        avatar_x = slide_clip.w - avatar_clip.w - 50  # 50px padding from right
-        avatar_y = slide_clip.h - avatar_clip.h - 50  # 50px padding from bottom
-        avatar_clip = avatar_clip.set_position((avatar_x, avatar_y))
-        
-        # Composite clips
-        final_clip = CompositeVideoClip([slide_clip, avatar_clip])
-        final_clip = final_clip.set_audio(audio_clip)
-        
-        # Write final video
-        final_clip.write_videofile(output_path, fps=24)
+    def has_nvenc(self):
+        """Check once whether ffmpeg can encode H.264 on an NVIDIA GPU"""
+        if self._nvenc is None:
+            # A tiny test encode, since ffmpeg builds list nvenc even without a GPU
+            try:
+                run_ffmpeg([
+                    "-f", "lavfi", "-i", "color=size=256x256:duration=0.1",
+                    "-c:v", "h264_nvenc", "-f", "null", "-"
+                ])
+                self._nvenc = True
+            except (RuntimeError, OSError):
+                self._nvenc = False
+        return self._nvenc
+    
+    def video_encoder_args(self, final=False, nvenc=True):
+        """ffmpeg video encoder arguments: NVENC when available (and allowed), otherwise x264"""
+        if nvenc and self.has_nvenc():
+            return ["-c:v", "h264_nvenc", "-preset", "p4", "-rc", "vbr", "-cq", "23", "-b:v", "8M"]
+        if final:
+            return ["-c:v", "libx264", "-preset", "medium", "-crf", "20"]
+        # Intermediate encode, so trade size for speed, using only the CPUs
+        # this process is pinned to
+        threads = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else 0
+        return ["-c:v", "libx264", "-preset", "ultrafast", "-tune", "stillimage", "-threads", str(threads)]
+    
+    def combine_slide_and_avatar(self, slide_path, avatar_video_path, audio_path, output_path, slide_duration=10, nvenc=True):
+        """
+        Combine slide, avatar video, and audio into final video.
+        
+        The slide is a still image, so ffmpeg decodes it once and loops it
+        underneath the avatar instead of MoviePy compositing every frame.
+        Without an avatar the slide is simply muxed with its narration.
+        
+        The narration is copied as-is, so output_path should be a container
+        that accepts any audio codec (e.g. .mkv); it is encoded at most once,
+        when the slides are joined. nvenc=False forces the x264 encoder.
+        """
+        if not avatar_video_path:
+            run_ffmpeg([
+                "-loop", "1", "-i", slide_path,
+                "-i", audio_path,
+                "-map", "0:v", "-map", "1:a", "-c:a", "copy",
+                *self.video_encoder_args(nvenc=nvenc),
+                "-pix_fmt", "yuv420p", "-r", "30",
+                "-t", f"{slide_duration:.3f}", "-shortest",
+                output_path
+            ])
+            return output_path
+        
+        # Avatar scaled by swscale in the same pass (even height, to line up
+        # with yuv420p chroma) and overlaid at the precomputed position
+        avatar_x, avatar_y = self.avatar_position
+        run_ffmpeg([
+            "-loop", "1", "-i", slide_path,
+            "-i", avatar_video_path,
+            "-i", audio_path,
+            "-filter_complex", f"[1:v]scale={self.avatar_width}:-2[av];[0:v][av]overlay={avatar_x}:{avatar_y}",
+            "-map", "2:a", "-c:a", "copy",
+            *self.video_encoder_args(nvenc=nvenc),
+            "-pix_fmt", "yuv420p", "-r", "30",
+            "-t", f"{slide_duration:.3f}", "-shortest",
+            output_path
+        ])
         return output_path
     
-    def process_slides(self, slide_paths, texts, audio_paths, avatar_style="professional", did_api_key=None):
-        """Process all slides and create a final video"""
-        processed_clips = []
+    def _join_slide_videos(self, slide_videos, output_path):
+        """
+        Join the slide videos into the final video.
         
-        for i, (slide_path, text, audio_path) in enumerate(zip(slide_paths, texts, audio_paths)):
+        Slide videos with identical stream parameters are joined by the concat
+        demuxer, copying packets instead of re-encoding. ffmpeg does not
+        refuse to stream-copy mismatched streams (it writes a broken file
+        instead), so the parameters are compared up front, and the slides are
+        decoded and joined with the concat filter if they differ or the copy
+        fails.
+        """
+        video_params = {
+            tuple(sorted(probe_stream(path, "v:0", VIDEO_STREAM_FIELDS).items()))
+            for path in slide_videos
+        }
+        audio_params = [probe_stream(path, "a:0", AUDIO_STREAM_FIELDS) for path in slide_videos]
+        if len(video_params) == 1 and all(params == audio_params[0] for params in audio_params):
+            # The narration is copied too if mp4 can hold it, otherwise it is
+            # encoded to AAC here, once for the whole presentation
+            if audio_params[0].get("codec_name") in ("aac", "mp3"):
+                audio_codec = ["-c:a", "copy"]
+            else:
+                audio_codec = ["-c:a", "aac", "-b:a", "128k"]
+            
+            concat_list = os.path.join(self.temp_dir, "concat.txt")
+            with open(concat_list, "w") as f:
+                for path in slide_videos:
+                    f.write(_concat_entry(path) + "\n")
             try:
-                # Get audio duration
-                audio_clip = AudioFileClip(audio_path)
-                duration = audio_clip.duration
-                audio_clip.close()
-                
-                # Create avatar video
-                avatar_video_path = os.path.join(self.temp_dir, f"avatar_{i}.mp4")
-                self.create_avatar_video(text, duration, avatar_video_path, avatar_style, did_api_key)
-                
-                # Create final video for this slide
-                slide_video_path = os.path.join(self.temp_dir, f"slide_{i}_final.mp4")
-                self.combine_slide_and_avatar(
-                    slide_path,
-                    avatar_video_path,
-                    audio_path,
-                    slide_video_path,
-                    duration
+                run_ffmpeg([
+                    "-f", "concat", "-safe", "0", "-i", concat_list,
+                    "-c:v", "copy", *audio_codec,
+                    "-movflags", "+faststart",
+                    output_path
+                ])
+                return output_path
+            except RuntimeError as e:
+                print(f"Stream copy concat failed, re-encoding instead: {str(e)}")
+        else:
+            print("Slide videos have different stream parameters, re-encoding instead")
+        
+        # Decode and join the slide videos inside ffmpeg with the concat filter,
+        # after bringing every slide to the same frame size, rate and audio format
+        width, height = self.slide_size
+        inputs = []
+        filters = []
+        for i, path in enumerate(slide_videos):
+            inputs += ["-i", path]
+            filters.append(
+                f"[{i}:v]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps=30,format=yuv420p[v{i}]"
+            )
+            filters.append(f"[{i}:a]aformat=sample_rates=44100:channel_layouts=stereo[a{i}]")
+        filters.append(
+            "".join(f"[v{i}][a{i}]" for i in range(len(slide_videos)))
+            + f"concat=n={len(slide_videos)}:v=1:a=1[v][a]"
+        )
+        run_ffmpeg(inputs + [
+            "-filter_complex", ";".join(filters),
+            "-map", "[v]", "-map", "[a]",
+            *self.video_encoder_args(final=True),
+            "-pix_fmt", "yuv420p", "-r", "30",
+            "-c:a", "aac", "-b:a", "128k",
+            output_path
+        ])
+        return output_path
+    
+    async def _fetch_avatar(self, session, semaphore, did, i, text, avatar_style):
+        """Download slide i's D-ID avatar, returning (i, path) or (i, None) on failure"""
+        presenter = DID_PRESENTERS.get(avatar_style, DID_PRESENTERS["default"])
+        avatar_video_path = os.path.join(self.temp_dir, f"avatar_{i}.mp4")
+        try:
+            async with semaphore:
+                await did.acreate_talking_avatar(
+                    session, text, avatar_video_path, presenter["avatar_id"], presenter["voice"]
                 )
-                
-                # Add to processed clips
-                clip = VideoFileClip(slide_video_path)
-                processed_clips.append(clip)
-                
-            except Exception as e:
-                print(f"Error processing slide {i+1}: {str(e)}")
-                continue
-        
-        if not processed_clips:
-            raise Exception("No slides were successfully processed")
+            return i, avatar_video_path
+        except Exception as e:
+            print(f"Error creating D-ID avatar for slide {i+1}: {str(e)}")
+            return i, None
+    
+    def _submit_slides(self, executor, slides, indices, avatar_style, avatar_video_path):
+        """
+        Hand the given slides, which share avatar_video_path, to the worker pool.
+        The avatar is removed as soon as the last of these slides is rendered,
+        so peak disk use doesn't grow with the number of slides.
+        
+        Returns:
+            list: Future for each slide's video path, in the order of indices
+        """
+        renders = [
+            executor.submit(
+                _render_slide,
+                (self, slides[i][0], slides[i][1], slides[i][2], i, avatar_style, avatar_video_path)
+            )
+            for i in indices
+        ]
+        if not avatar_video_path:
+            return renders
         
-        # Concatenate all clips
-        final_clip = concatenate_videoclips(processed_clips)
+        remaining = [len(renders)]
+        lock = threading.Lock()
         
-        # Save the final video
+        def release(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            try:
+                os.remove(avatar_video_path)
+            except OSError:
+                pass
+        
+        for render in renders:
+            render.add_done_callback(release)
+        return renders
+    
+    def _render_slides_with_simple_avatars(self, executor, slides, avatar_style):
+        """
+        Create each distinct narration's simple avatar in a thread pool and
+        hand its slides to the worker pool as soon as it is ready, so avatar
+        rendering overlaps encoding. Slides whose avatar failed get another
+        try at a simple avatar in the worker.
+        
+        Returns:
+            list: Slide video path (or None) for each slide, in slide order
+        """
+        if avatar_style == "none":
+            renders = self._submit_slides(executor, slides, range(len(slides)), avatar_style, None)
+            return [render.result() for render in renders]
+        
+        # Slides grouped by narration, so repeated text gets a single avatar
+        slides_by_text = {}
+        for i, (_, text, _) in enumerate(slides):
+            slides_by_text.setdefault(text, []).append(i)
+        
+        def create(i):
+            _, text, audio_path = slides[i]
+            return self.create_avatar_video(
+                text,
+                probe_duration(audio_path),
+                os.path.join(self.temp_dir, f"avatar_{i}.mp4"),
+                avatar_style
+            )
+        
+        renders = {}
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 2) as avatar_executor:
+            pending = {avatar_executor.submit(create, indices[0]): indices for indices in slides_by_text.values()}
+            for created in as_completed(pending):
+                indices = pending[created]
+                try:
+                    avatar_video_path = created.result()
+                except Exception as e:
+                    print(f"Error creating avatar for slide {indices[0]+1}: {str(e)}")
+                    avatar_video_path = None
+                renders.update(zip(
+                    indices,
+                    self._submit_slides(executor, slides, indices, avatar_style, avatar_video_path)
+                ))
+        
+        return [renders[i].result() for i in range(len(slides))]
+    
+    async def _render_slides_with_did(self, executor, slides, avatar_style, did_api_key):
+        """
+        Fetch every slide's D-ID avatar concurrently and hand each slide to the
+        worker pool as soon as its avatar is ready, so encoding overlaps the
+        remaining network requests. Each distinct narration is requested once
+        and its avatar shared by every slide with that text, then removed once
+        those slides are rendered; slides whose avatar failed fall back to a
+        simple avatar in the worker.
+        
+        Returns:
+            list: Slide video path (or None) for each slide, in slide order
+        """
+        did = DIDAvatar(did_api_key)
+        semaphore = asyncio.Semaphore(DID_MAX_CONCURRENT)
+        
+        # Slides grouped by narration, so repeated text is only sent to D-ID once
+        slides_by_text = {}
+        for i, (_, text, _) in enumerate(slides):
+            slides_by_text.setdefault(text, []).append(i)
+        
+        renders = {}
+        async with aiohttp.ClientSession() as session:
+            for fetched in asyncio.as_completed([
+                self._fetch_avatar(session, semaphore, did, indices[0], text, avatar_style)
+                for text, indices in slides_by_text.items()
+            ]):
+                first, avatar_video_path = await fetched
+                indices = slides_by_text[slides[first][1]]
+                renders.update(zip(
+                    indices,
+                    self._submit_slides(executor, slides, indices, avatar_style, avatar_video_path)
+                ))
+        
+        return await asyncio.gather(*[asyncio.wrap_future(renders[i]) for i in range(len(slides))])
+    
+    async def _fetch_avatars(self, texts, avatar_style, did_api_key):
+        """Fetch each distinct slide text's D-ID avatar concurrently, with None for any that failed"""
+        did = DIDAvatar(did_api_key)
+        semaphore = asyncio.Semaphore(DID_MAX_CONCURRENT)
+        first_slide = {}
+        for i, text in enumerate(texts):
+            first_slide.setdefault(text, i)
+        async with aiohttp.ClientSession() as session:
+            fetched = dict(await asyncio.gather(*[
+                self._fetch_avatar(session, semaphore, did, i, text, avatar_style)
+                for text, i in first_slide.items()
+            ]))
+        return [fetched[first_slide[text]] for text in texts]
+    
+    def _create_simple_avatars(self, texts, durations, avatar_style, avatar_paths=None):
+        """
+        Create a simple avatar for every slide that has no avatar yet,
+        rendered concurrently and only once per distinct slide text.
+        
+        Returns:
+            list: Avatar video path for each slide (None where creation failed)
+        """
+        avatar_paths = list(avatar_paths or [None] * len(texts))
+        with ThreadPoolExecutor(max_workers=os.cpu_count() or 2) as executor:
+            simple_avatars = {}
+            for i, (text, duration) in enumerate(zip(texts, durations)):
+                if not avatar_paths[i] and text not in simple_avatars:
+                    simple_avatars[text] = executor.submit(
+                        self.create_avatar_video,
+                        text,
+                        duration,
+                        os.path.join(self.temp_dir, f"avatar_{i}.mp4"),
+                        avatar_style
+                    )
+        
+        for i, text in enumerate(texts):
+            if not avatar_paths[i]:
+                try:
+                    avatar_paths[i] = simple_avatars[text].result()
+                except Exception as e:
+                    print(f"Error creating avatar for slide {i+1}: {str(e)}")
+        return avatar_paths
+    
+    def _render_single_pass(self, slide_paths, texts, audio_paths, output_path, avatar_style, did_api_key):
+        """
+        Render the whole presentation with one ffmpeg filtergraph instead of
+        encoding every slide separately and concatenating the results.
+        """
+        durations = [probe_duration(audio_path) for audio_path in audio_paths]
+        if avatar_style == "none":
+            avatar_paths = [None] * len(slide_paths)
+        else:
+            if did_api_key:
+                avatar_paths = asyncio.run(self._fetch_avatars(texts, avatar_style, did_api_key))
+            else:
+                avatar_paths = [None] * len(slide_paths)
+            avatar_paths = self._create_simple_avatars(texts, durations, avatar_style, avatar_paths)
+        
+        return render_slideshow(
+            slide_paths,
+            audio_paths,
+            output_path,
+            avatar_paths=avatar_paths,
+            durations=durations,
+            avatar_width=self.avatar_width,
+            avatar_position=self.avatar_position,
+            video_codec=self.video_encoder_args(final=True)
+        )
+    
+    def process_slides(self, slide_paths, texts, audio_paths, avatar_style="professional", did_api_key=None, single_pass=False):
+        """
+        Process all slides and create a final video.
+        
+        By default each slide is encoded in a parallel worker process and the
+        results are joined; with single_pass the whole presentation is
+        composited and encoded by a single ffmpeg process instead. An
+        avatar_style of "none" leaves out the avatar overlay.
+        """
+        os.makedirs(self.temp_dir, exist_ok=True)
         final_video_path = os.path.join(self.output_dir, "final_presentation.mp4")
-        final_clip.write_videofile(final_video_path, fps=30, codec='libx264')
+        if single_pass:
+            self._render_single_pass(slide_paths, texts, audio_paths, final_video_path, avatar_style, did_api_key)
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            return final_video_path
         
-        # Clean up
-        for clip in processed_clips:
-            clip.close()
-        final_clip.close()
+        # Probe the encoder before the generator is copied into the workers
+        self.has_nvenc()
+        
+        # Render the slides in parallel worker processes, keeping their order
+        slides = list(zip(slide_paths, texts, audio_paths))
+        max_workers = max(1, min(len(slides), (os.cpu_count() or 2) // 2))
+        if self.has_nvenc():
+            # Consumer GPUs only allow a few NVENC sessions at once
+            max_workers = min(max_workers, NVENC_MAX_SESSIONS)
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(multiprocessing.Value("i", 0), max_workers)
+        ) as executor:
+            if did_api_key and avatar_style != "none":
+                slide_videos = asyncio.run(
+                    self._render_slides_with_did(executor, slides, avatar_style, did_api_key)
+                )
+            else:
+                slide_videos = self._render_slides_with_simple_avatars(executor, slides, avatar_style)
+        
+        slide_videos = [path for path in slide_videos if path]
+        if not slide_videos:
+            raise Exception("No slides were successfully processed")
+        
+        self._join_slide_videos(slide_videos, final_video_path)
         
         # Clean up temporary files
-        try:
-            for file in os.listdir(self.temp_dir):
-                file_path = os.path.join(self.temp_dir, file)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            os.rmdir(self.temp_dir)
-        except:
-            pass
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
         
         return final_video_path 
\ No newline at end of file